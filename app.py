@@ -2,12 +2,17 @@
 A movie recommender app built with Streamlit.
 """
 
+import asyncio
+
 import numpy as np
 import pandas as pd
 import streamlit as st
 import validators
 
+from get_covers import cover_index_mtime, load_cover_index, read_covers
+from model_store import ModelStore
 from recommender import Recommender
+from title_search import TitleIndex, add_favourites, load_title_index, source_stamps
 
 
 @st.cache_data
@@ -19,6 +24,40 @@ def load_movies() -> pd.DataFrame:
     return movies
 
 
+@st.cache_resource
+def get_model_store() -> ModelStore:
+    """
+    Function to load the current models once and watch for new snapshots.
+    """
+    store = ModelStore()
+    store.refresh()
+    store.start()
+    return store
+
+
+@st.cache_data(max_entries=1)
+def load_covers(index_mtime: float) -> pd.DataFrame:
+    """
+    Function to load the index of locally stored cover thumbnails.
+    The modification time of the index is part of the cache key,
+    so covers downloaded while the app is running are picked up.
+    Only the latest index is kept.
+    """
+    return load_cover_index()
+
+
+@st.cache_data(max_entries=100)
+def prefetch_covers(
+    movie_ids: tuple[int, ...], index_mtime: float
+) -> dict[int, bytes | None]:
+    """
+    Function to read the cover thumbnails of all recommended movies at once.
+    Only the most recent recommendations are kept, thumbnails are small
+    and read quickly from disk.
+    """
+    return read_covers(list(movie_ids), load_covers(index_mtime))
+
+
 @st.cache_data
 def get_random_movies_to_rate(num_movies: int = 5) -> pd.DataFrame:
     """
@@ -34,33 +73,32 @@ def get_random_movies_to_rate(num_movies: int = 5) -> pd.DataFrame:
     return movies.iloc[select]
 
 
-@st.cache_data
-def get_movies() -> pd.DataFrame:
+@st.cache_resource(max_entries=1)
+def get_title_index(stamps: tuple) -> TitleIndex:
     """
-    Function to get movie titles and ids to be selected by the user.
+    Function to load the title search index, or build it if it doesn't exist.
+    The stamps of the source files are part of the cache key, so the index
+    is rebuilt when the catalog changes. Only the latest index is kept.
     """
-    movies = load_movies()
-    movies = movies.sort_values("title").reset_index(drop=True)
-
-    return movies
+    return load_title_index()
 
 
-@st.cache_data
-def get_movie_id_from_title(title_str: str) -> int:
+def add_matches() -> None:
     """
-    Function that returns a movies ID from a title input.
+    Callback to move the movies selected from the search results
+    to the favourites and clear the selection.
     """
-    movies = load_movies()
-    movies = movies[movies["title"] == title_str]["movie_id"]
-
-    return int(movies.iloc[0])
+    st.session_state["favourites"] = add_favourites(
+        st.session_state["favourites"], st.session_state["title_matches"]
+    )
+    st.session_state["title_matches"] = []
 
 
 def prepare_query_favourites() -> dict:
     """
     Function to prepare query to search for movies based on favourite movies.
     """
-    data = get_movies()
+    index = get_title_index(source_stamps())
 
     st.markdown(
         "Don't know which movie to watch tonight?"
@@ -68,17 +106,37 @@ def prepare_query_favourites() -> dict:
         "we'll recommend you something you might like."
     )
 
-    user_ratings = st.multiselect(
-        "Select as many movies as you like. Type to filter the list.",
-        data["title"],
+    # Selected movies are kept in the session, since the options of the
+    # widgets change with every search, which resets their state
+    if "favourites" not in st.session_state:
+        st.session_state["favourites"] = []
+    favourites = [
+        movie_id
+        for movie_id in st.session_state["favourites"]
+        if movie_id in index.positions
+    ]
+
+    search = st.text_input("Search for movies by title.", key="title_search")
+
+    # Only send movies matching the search to the browser
+    st.multiselect(
+        "Select movies to add them to your favourites.",
+        index.get_candidates(search, exclude=favourites),
+        format_func=index.get_title,
+        key="title_matches",
+        on_change=add_matches,
     )
 
-    query = {}
-    for title_selected in user_ratings:
-        # Get movie ids
-        mid = get_movie_id_from_title(title_selected)
-        # Set rating to 5 for selected movies
-        query[mid] = 5
+    favourites = st.multiselect(
+        "Your favourite movies. Remove a movie by clicking its x.",
+        favourites,
+        default=favourites,
+        format_func=index.get_title,
+    )
+    st.session_state["favourites"] = favourites
+
+    # Set rating to 5 for selected movies
+    query = {int(movie_id): 5 for movie_id in favourites}
 
     return query
 
@@ -133,18 +191,32 @@ def recommender(rec_type: str = "fav") -> None:
     # Start recommender
     if st.button("Recommend some movies!", key="button_" + rec_type):
         with st.spinner(f"Calculating recommendations using {method_select}..."):
-            recommend = Recommender(query, method=method, k=num_movies)
-            movie_ids, _ = recommend.recommend()
+            recommend = Recommender(
+                query,
+                method=method,
+                k=num_movies,
+                snapshot=get_model_store().current,
+            )
+            movie_ids, _, tier = asyncio.run(recommend.recommend_async(timeout=5.0))
+
+        if tier == "cache":
+            st.info("This is taking longer than usual, showing earlier results.")
+        elif tier == "popular":
+            st.info("This is taking longer than usual, showing top rated movies.")
 
         with st.spinner("Fetching movie information from IMDB..."):
+            covers = prefetch_covers(
+                tuple(int(movie_id) for movie_id in movie_ids), cover_index_mtime()
+            )
             st.write("Recommended movies using Nearest Neighbors:\n")
             for movie_id in movie_ids:
-                display_movie(movie_id)
+                display_movie(movie_id, covers.get(int(movie_id)))
 
 
-def display_movie(movie_id: int) -> None:
+def display_movie(movie_id: int, cover: bytes | None = None) -> None:
     """
     Function that displays a movie with information from IMDB.
+    Uses the local cover thumbnail if available, the remote cover otherwise.
     """
     movies = load_movies()
     movie = movies[movies["movie_id"] == movie_id].copy()
@@ -152,7 +224,9 @@ def display_movie(movie_id: int) -> None:
     col1, col2 = st.columns([1, 4])
 
     with col1:
-        if validators.url(str(movie["cover_url"].iloc[0])):
+        if cover is not None:
+            st.image(cover)
+        elif validators.url(str(movie["cover_url"].iloc[0])):
             st.image(movie["cover_url"].iloc[0])
 
     with col2:
@@ -2,20 +2,41 @@
 Build and save models for the recommender
 """
 
+import argparse
+import json
 import pickle
+import shutil
+import time
+import uuid
+from pathlib import Path
 
 import pandas as pd
 from scipy.sparse import csr_matrix
 from sklearn.decomposition import NMF
 from sklearn.neighbors import NearestNeighbors
 
-
-def build_model_nmf(n_components: int = 2000, max_iter: int = 1000) -> str:
+from model_store import (
+    MANIFEST_FILE,
+    MODEL_DIR,
+    PREPARED_DATA,
+    file_checksum,
+    publish_snapshot,
+    read_current_version,
+)
+from sharded_neighbors import ShardedNearestNeighbors
+
+
+def build_model_nmf(
+    n_components: int = 2000,
+    max_iter: int = 1000,
+    file_name: str = "data/model_nmf.pkl",
+    ratings_file: str = "data/ratings_prepared.csv",
+) -> str:
     """
     Function to build and save a recommender model using NMF.
     """
     # Load prepared data
-    ratings = pd.read_csv("data/ratings_prepared.csv")
+    ratings = pd.read_csv(ratings_file)
 
     # Initialize a sparse user-item rating matrix
     r_matrix = csr_matrix(
@@ -38,19 +59,27 @@ def build_model_nmf(n_components: int = 2000, max_iter: int = 1000) -> str:
     print(f"NMF model built. Reconstruction error: {model.reconstruction_err_}")
 
     # Save model
-    file_name = "data/model_nmf.pkl"
     with open(file_name, "wb") as file:
         pickle.dump(model, file)
 
     return file_name
 
 
-def build_model_neighbors(metric: str = "cosine", n_jobs: int = -1) -> str:
+def build_model_neighbors(
+    metric: str = "cosine",
+    n_jobs: int = -1,
+    n_shards: int = 1,
+    backend: str = "thread",
+    file_name: str = "data/model_neighbors.pkl",
+    ratings_file: str = "data/ratings_prepared.csv",
+) -> str:
     """
     Function to build and save a recommender model using Nearest Neighbors.
+    With n_shards > 1, users are split into shards that are queried in parallel
+    by threads or, with backend "process", by one worker process per shard.
     """
     # Load prepared data
-    ratings = pd.read_csv("data/ratings_prepared.csv")
+    ratings = pd.read_csv(ratings_file)
 
     # Initialize a sparse user-item rating matrix
     r_matrix = csr_matrix(
@@ -58,11 +87,18 @@ def build_model_neighbors(metric: str = "cosine", n_jobs: int = -1) -> str:
     )
 
     # Initialize the NearestNeighbors model
-    model = NearestNeighbors(metric=metric, n_jobs=n_jobs)
+    if n_shards > 1:
+        model = ShardedNearestNeighbors(
+            n_shards=n_shards, metric=metric, n_jobs=n_jobs, backend=backend
+        )
+    else:
+        model = NearestNeighbors(metric=metric, n_jobs=n_jobs)
     print(
         "Nearest Neighbors model instantiated with following hyperparameters:\n"
         f"metric={metric}\n"
-        f"n_jobs={n_jobs}\n\n"
+        f"n_jobs={n_jobs}\n"
+        f"n_shards={n_shards}\n"
+        f"backend={backend}\n\n"
         "Starting to fit.\n"
     )
 
@@ -73,24 +109,142 @@ def build_model_neighbors(metric: str = "cosine", n_jobs: int = -1) -> str:
     print("Nearest neighbor model built.")
 
     # Save model
-    file_name = "data/model_neighbors.pkl"
     with open(file_name, "wb") as file:
         pickle.dump(model, file)
 
     return file_name
 
 
-def main() -> None:
+def copy_prepared_data(staging_dir: Path) -> dict[str, str]:
     """
-    Main function
+    Function to copy the prepared data into a staging directory, so the
+    models are trained on and served with exactly the same data.
+    Files are copied, not linked, since prepare_data.py overwrites them.
+    """
+    files = {}
+    for name, file_name in PREPARED_DATA.items():
+        files[name] = str(
+            shutil.copy2(file_name, Path(staging_dir) / Path(file_name).name)
+        )
+
+    return files
+
+
+def write_snapshot(
+    staging_dir: Path, version: str, model_dir: Path = MODEL_DIR
+) -> Path:
+    """
+    Function to write the manifest for all models and prepared data in a
+    staging directory and move it to its final snapshot directory in one step.
     """
 
-    file_name_nmf = build_model_nmf()
-    print(f"NMF model saved to {file_name_nmf}.")
+    def describe(file_name: Path) -> dict:
+        return {
+            "file": file_name.name,
+            "sha256": file_checksum(file_name),
+            "size": file_name.stat().st_size,
+        }
+
+    models = {
+        file_name.stem.removeprefix("model_"): describe(file_name)
+        for file_name in sorted(Path(staging_dir).glob("model_*.pkl"))
+    }
+    data = {
+        name: describe(Path(staging_dir) / Path(file_name).name)
+        for name, file_name in PREPARED_DATA.items()
+    }
+
+    manifest = {
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "models": models,
+        "data": data,
+    }
+    with open(Path(staging_dir) / MANIFEST_FILE, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+
+    snapshot_dir = Path(model_dir) / version
+    Path(staging_dir).rename(snapshot_dir)
+
+    return snapshot_dir
+
+
+def prune_snapshots(keep: int = 3, model_dir: Path = MODEL_DIR) -> list[str]:
+    """
+    Function to delete all but the newest snapshots.
+    The current snapshot is never deleted, nor are hidden staging directories
+    of builds that are still running.
+    """
+    current = read_current_version(model_dir)
+    snapshots = sorted(
+        path.name
+        for path in Path(model_dir).iterdir()
+        if not path.name.startswith(".") and (path / MANIFEST_FILE).is_file()
+    )
 
-    file_name_neighbors = build_model_neighbors()
-    print(f"Nearest Neighbors model saved to {file_name_neighbors}.")
+    removed = [version for version in snapshots[:-keep] if version != current]
+    for version in removed:
+        shutil.rmtree(Path(model_dir) / version)
+
+    return removed
+
+
+def main(n_shards: int = 1, backend: str = "thread") -> None:
+    """
+    Main function
+    """
+    # Build into a hidden staging directory, so a running app
+    # never sees an incomplete snapshot. Versions sort by time, the suffix
+    # keeps builds started in the same second apart.
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    staging_dir = MODEL_DIR / f".{version}.tmp"
+    staging_dir.mkdir(parents=True)
+
+    try:
+        # Train on the copy of the prepared data stored with the snapshot
+        data_files = copy_prepared_data(staging_dir)
+
+        file_name_nmf = build_model_nmf(
+            file_name=str(staging_dir / "model_nmf.pkl"),
+            ratings_file=data_files["ratings"],
+        )
+        print(f"NMF model saved to {file_name_nmf}.")
+
+        file_name_neighbors = build_model_neighbors(
+            n_shards=n_shards,
+            backend=backend,
+            file_name=str(staging_dir / "model_neighbors.pkl"),
+            ratings_file=data_files["ratings"],
+        )
+        print(f"Nearest Neighbors model saved to {file_name_neighbors}.")
+
+        snapshot_dir = write_snapshot(staging_dir, version)
+    finally:
+        # Left over if the build failed, write_snapshot() moves it otherwise
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir)
+
+    publish_snapshot(version)
+    print(f"Snapshot {version} saved to {snapshot_dir} and published.")
+
+    for removed in prune_snapshots():
+        print(f"Old snapshot {removed} removed.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build and publish new models.")
+    parser.add_argument(
+        "--n-shards",
+        type=int,
+        default=1,
+        help="number of shards to split the Nearest Neighbors model into",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["thread", "process"],
+        default="thread",
+        help="how the shards are queried in parallel",
+    )
+    args = parser.parse_args()
+
+    main(n_shards=args.n_shards, backend=args.backend)
@@ -0,0 +1,223 @@
+"""
+Download movie covers once and store them as local thumbnails
+"""
+
+import hashlib
+import http.client
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+import pandas as pd
+import validators
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+COVER_DIR = Path("data/covers")
+THUMBNAIL_SIZE = (200, 296)
+
+
+def load_movies() -> pd.DataFrame:
+    """
+    Function to load movies with IMDB information from CSV file.
+    """
+    movies = pd.read_csv("./data/movies_imdb.csv")
+    return movies
+
+
+def fetch_cover(url: str, timeout: float = 10.0) -> bytes | None:
+    """
+    Function to download a cover image. Returns None if the download fails.
+    """
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            return response.read()
+    except (URLError, OSError, ValueError, http.client.HTTPException) as error:
+        print(f"Could not fetch cover from {url}: {error!r}")
+        return None
+
+
+def make_thumbnail(data: bytes, size: tuple[int, int] = THUMBNAIL_SIZE) -> bytes:
+    """
+    Function to resize and crop an image to a fixed size JPEG thumbnail.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        thumbnail = ImageOps.fit(image.convert("RGB"), size)
+
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=85)
+
+    return buffer.getvalue()
+
+
+def cover_path(digest: str, cover_dir: Path = COVER_DIR) -> Path:
+    """
+    Function to get the path of a thumbnail in the content-addressed store.
+    """
+    return Path(cover_dir) / digest[:2] / f"{digest}.jpg"
+
+
+def store_thumbnail(data: bytes, cover_dir: Path = COVER_DIR) -> str:
+    """
+    Function to save a thumbnail under its SHA-256 digest.
+    Identical images are only stored once. Returns the digest.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    file_name = cover_path(digest, cover_dir)
+
+    if not file_name.is_file():
+        file_name.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial images
+        with tempfile.NamedTemporaryFile(dir=file_name.parent, delete=False) as file:
+            file.write(data)
+        os.replace(file.name, file_name)
+
+    return digest
+
+
+def load_cover_index(cover_dir: Path = COVER_DIR) -> pd.DataFrame:
+    """
+    Function to load the index mapping movie ids to thumbnail digests.
+    """
+    index_file = Path(cover_dir) / "index.csv"
+
+    if not index_file.is_file():
+        return pd.DataFrame(columns=["movie_id", "cover_url", "digest"])
+
+    return pd.read_csv(index_file)
+
+
+def cover_index_mtime(cover_dir: Path = COVER_DIR) -> float:
+    """
+    Function to get the modification time of the index, 0 if there is none.
+    Used to notice when covers have been downloaded.
+    """
+    try:
+        return (Path(cover_dir) / "index.csv").stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def save_cover_index(index: pd.DataFrame, cover_dir: Path = COVER_DIR) -> str:
+    """
+    Function to save the index mapping movie ids to thumbnail digests.
+    """
+    index_file = Path(cover_dir) / "index.csv"
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+
+    temp_file = index_file.with_suffix(".tmp")
+    index.sort_values("movie_id").to_csv(temp_file, index=False)
+    os.replace(temp_file, index_file)
+
+    return str(index_file)
+
+
+def download_cover(
+    movie_id: int,
+    url: str,
+    cover_dir: Path = COVER_DIR,
+    size: tuple[int, int] = THUMBNAIL_SIZE,
+    fetch=fetch_cover,
+) -> dict | None:
+    """
+    Function to download one cover and store it as a thumbnail.
+    Returns an index entry or None if the cover is not available.
+    Errors only skip this cover, so the other downloads are still indexed.
+    """
+    try:
+        data = fetch(url)
+        if data is None:
+            return None
+        thumbnail = make_thumbnail(data, size)
+        digest = store_thumbnail(thumbnail, cover_dir)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as error:
+        print(f"Could not read cover for movie {movie_id}: {error!r}")
+        return None
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        print(f"Could not store cover for movie {movie_id}: {error!r}")
+        return None
+
+    return {"movie_id": movie_id, "cover_url": url, "digest": digest}
+
+
+def download_covers(
+    movies: pd.DataFrame,
+    cover_dir: Path = COVER_DIR,
+    size: tuple[int, int] = THUMBNAIL_SIZE,
+    max_workers: int = 16,
+    fetch=fetch_cover,
+) -> pd.DataFrame:
+    """
+    Function to concurrently download all covers that are not stored yet.
+    Covers are skipped if the index already holds an entry for the same URL.
+    Returns the updated index.
+    """
+    index = load_cover_index(cover_dir)
+    known = set(zip(index["movie_id"], index["cover_url"]))
+
+    todo = [
+        (int(movie_id), url)
+        for movie_id, url in zip(movies["movie_id"], movies["cover_url"])
+        if validators.url(str(url)) and (movie_id, url) not in known
+    ]
+    print(f"{len(todo)} covers to download, {len(known)} already stored.")
+
+    # Covers downloaded before an interruption are saved to the index as well
+    entries = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for entry in executor.map(
+                lambda item: download_cover(*item, cover_dir, size, fetch), todo
+            ):
+                if entry is not None:
+                    entries.append(entry)
+    finally:
+        if entries:
+            new_entries = pd.DataFrame(entries)
+            index = pd.concat(
+                [index[~index["movie_id"].isin(new_entries["movie_id"])], new_entries],
+                ignore_index=True,
+            )
+            save_cover_index(index, cover_dir)
+
+        print(f"{len(entries)} of {len(todo)} covers downloaded.")
+
+    return index
+
+
+def read_covers(
+    movie_ids: list[int], index: pd.DataFrame, cover_dir: Path = COVER_DIR
+) -> dict[int, bytes | None]:
+    """
+    Function to read the thumbnails of several movies from the local store.
+    Movies without a stored thumbnail are mapped to None.
+    """
+    digests = index.set_index("movie_id")["digest"]
+
+    covers = {}
+    for movie_id in movie_ids:
+        covers[movie_id] = None
+        if movie_id in digests.index:
+            try:
+                covers[movie_id] = cover_path(digests[movie_id], cover_dir).read_bytes()
+            except OSError:
+                pass
+
+    return covers
+
+
+def main() -> None:
+    """
+    Main function
+    """
+    movies = load_movies()
+    index = download_covers(movies)
+    print(f"Cover index with {len(index)} entries saved to {COVER_DIR}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Versioned model snapshots that can be swapped while the app is running.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from recommender import Recommender
+
+MODEL_DIR = Path("data/models")
+CURRENT_FILE = "current"
+MANIFEST_FILE = "manifest.json"
+
+LEGACY_MODELS = {
+    "nmf": "data/model_nmf.pkl",
+    "neighbors": "data/model_neighbors.pkl",
+}
+
+# Prepared data the models were trained on, stored with every snapshot
+PREPARED_DATA = {
+    "movies": "data/movies_prepared.csv",
+    "ratings": "data/ratings_prepared.csv",
+}
+
+
+def file_checksum(file_name: Path) -> str:
+    """
+    Function to calculate the SHA-256 checksum of a file.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def read_current_version(model_dir: Path = MODEL_DIR) -> str | None:
+    """
+    Function to read the version the "current" pointer refers to.
+    Returns None if no snapshot has been published yet.
+    """
+    try:
+        return (Path(model_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+
+
+def publish_snapshot(version: str, model_dir: Path = MODEL_DIR) -> None:
+    """
+    Function to atomically point "current" to a snapshot version.
+    """
+    if not (Path(model_dir) / version / MANIFEST_FILE).is_file():
+        raise ValueError(f"Snapshot {version} has no manifest.")
+
+    temp_file = Path(model_dir) / f"{CURRENT_FILE}.tmp"
+    temp_file.write_text(version, encoding="utf-8")
+    os.replace(temp_file, Path(model_dir) / CURRENT_FILE)
+
+
+class ModelSnapshot:
+    """
+    Class holding all models of one snapshot version and the prepared
+    data they were trained on in memory.
+    """
+
+    def __init__(
+        self, version: str, models: dict[str, object], data: dict[str, pd.DataFrame]
+    ) -> None:
+        self.version = version
+        self.models = models
+        self.data = data
+
+    @classmethod
+    def load(cls, version: str, model_dir: Path = MODEL_DIR) -> "ModelSnapshot":
+        """
+        Loads all models listed in a snapshot's manifest and verifies
+        their checksums.
+        """
+        snapshot_dir = Path(model_dir) / version
+        with open(snapshot_dir / MANIFEST_FILE, encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        for entry in [*manifest["models"].values(), *manifest["data"].values()]:
+            file_name = snapshot_dir / entry["file"]
+            if file_checksum(file_name) != entry["sha256"]:
+                raise ValueError(f"Checksum mismatch for {file_name}.")
+
+        models = {}
+        for method, entry in manifest["models"].items():
+            with open(snapshot_dir / entry["file"], "rb") as file:
+                models[method] = pickle.load(file)
+
+        data = {
+            name: pd.read_csv(snapshot_dir / entry["file"])
+            for name, entry in manifest["data"].items()
+        }
+
+        return cls(manifest["version"], models, data)
+
+    @classmethod
+    def load_legacy(cls) -> "ModelSnapshot":
+        """
+        Loads the models saved directly in data/ by earlier versions.
+        """
+        models = {}
+        for method, file_name in LEGACY_MODELS.items():
+            if Path(file_name).is_file():
+                with open(file_name, "rb") as file:
+                    models[method] = pickle.load(file)
+
+        data = {
+            name: pd.read_csv(file_name) for name, file_name in PREPARED_DATA.items()
+        }
+
+        return cls("legacy", models, data)
+
+    def get_warm_queries(self, num_movies: int = 5) -> list[dict]:
+        """
+        Function to get queries for warming up, made of the movies
+        with the most ratings in the snapshot's data.
+        """
+        movie_ids = self.data["ratings"]["movie_id"].value_counts().index
+        return [{int(movie_id): 5 for movie_id in movie_ids[:num_movies]}]
+
+
+class ModelStore:
+    """
+    Class that serves the current model snapshot and swaps in new versions.
+    Requests take a reference to the current snapshot once and use it until
+    they are done, so a swap never affects requests that are in flight.
+    """
+
+    def __init__(
+        self, model_dir: Path = MODEL_DIR, warm_queries: list[dict] | None = None
+    ) -> None:
+        self.model_dir = Path(model_dir)
+        # Derived from each snapshot's data if None
+        self.warm_queries = warm_queries
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self) -> ModelSnapshot:
+        """
+        The snapshot new requests should use.
+        """
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """
+        Loads and warms the snapshot "current" points to and swaps it in
+        if it differs from the one being served. Returns True on a swap.
+        """
+        with self._lock:
+            version = read_current_version(self.model_dir)
+            served = None if self._snapshot is None else self._snapshot.version
+
+            if version is None and served is None:
+                self._snapshot = ModelSnapshot.load_legacy()
+                return True
+            if version is None or version == served:
+                return False
+
+            snapshot = ModelSnapshot.load(version, self.model_dir)
+            self.warm(snapshot)
+
+            # A single reference update, the old snapshot is freed once
+            # the last request using it has finished
+            self._snapshot = snapshot
+            del snapshot
+            gc.collect()
+
+            print(f"Serving model snapshot {version} (was {served}).")
+            return True
+
+    def warm(self, snapshot: ModelSnapshot) -> None:
+        """
+        Runs a few queries on a snapshot before it is swapped in.
+        """
+        queries = self.warm_queries or snapshot.get_warm_queries()
+        for query in queries:
+            for method in snapshot.models:
+                Recommender(query, method=method, k=5, snapshot=snapshot).recommend()
+
+    def start(self, interval: float = 30.0) -> None:
+        """
+        Starts a background thread that checks for new snapshots.
+        """
+        if self._thread is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                # Any error while loading or warming a snapshot must not end
+                # the thread, the old snapshot is served and loading retried
+                try:
+                    self.refresh()
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    print(f"Could not load new model snapshot: {error!r}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=watch, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,222 @@
+"""
+Prepare MovieLens ratings and movies for the recommender.
+Ratings are streamed in chunks, so full-size dumps don't need to fit in memory.
+"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RATINGS_DTYPES = {
+    "userId": np.int64,
+    "movieId": np.int64,
+    "rating": np.float64,
+    "timestamp": np.int64,
+}
+
+
+def read_ratings_chunks(file_name: str, chunksize: int):
+    """
+    Function to read the raw ratings CSV file in chunks.
+    """
+    return pd.read_csv(file_name, dtype=RATINGS_DTYPES, chunksize=chunksize)
+
+
+def grow(array: np.ndarray, size: int, fill_value=0) -> np.ndarray:
+    """
+    Function to enlarge an array to a given size, keeping its values.
+    """
+    if len(array) >= size:
+        return array
+
+    grown = np.full(size, fill_value, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def count_ratings(
+    file_name: str, chunksize: int = 1_000_000
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    First pass: count and sum up the ratings per raw movie id.
+    Returns counts and sums indexed by movie id, and the highest user id.
+    """
+    counts = np.zeros(0, dtype=np.int64)
+    sums = np.zeros(0, dtype=np.float64)
+    max_user_id = -1
+
+    for chunk in read_ratings_chunks(file_name, chunksize):
+        movie_ids = chunk["movieId"].to_numpy()
+        size = int(movie_ids.max()) + 1
+
+        counts = grow(counts, size)
+        sums = grow(sums, size)
+        counts += np.bincount(movie_ids, minlength=len(counts))
+        sums += np.bincount(movie_ids, weights=chunk["rating"], minlength=len(sums))
+
+        max_user_id = max(max_user_id, int(chunk["userId"].max()))
+
+    return counts, sums, max_user_id
+
+
+def assign_new_ids(raw_ids: np.ndarray, lookup: np.ndarray, next_id: int) -> int:
+    """
+    Function to give raw ids that are not in the lookup array yet
+    the next sequential ids, in order of their first appearance.
+    Returns the next free id.
+    """
+    unique_ids = pd.unique(raw_ids)
+    new_ids = unique_ids[lookup[unique_ids] < 0]
+    lookup[new_ids] = np.arange(next_id, next_id + len(new_ids))
+
+    return next_id + len(new_ids)
+
+
+def remap_ratings(
+    file_name: str,
+    popular: np.ndarray,
+    max_user_id: int,
+    bucket_dir: Path,
+    bucket_size: int = 10_000,
+    chunksize: int = 1_000_000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Second pass: filter ratings of popular movies, replace user and movie ids
+    by sequential ids and write the rows to bucket files by user id.
+    Returns lookup arrays from raw ids to new ids (-1 for unused ids).
+    """
+    user_lookup = np.full(max_user_id + 1, -1, dtype=np.int64)
+    movie_lookup = np.full(len(popular), -1, dtype=np.int64)
+    next_user_id, next_movie_id = 0, 0
+
+    for chunk in read_ratings_chunks(file_name, chunksize):
+        chunk = chunk[popular[chunk["movieId"].to_numpy()]]
+
+        user_ids = chunk["userId"].to_numpy()
+        movie_ids = chunk["movieId"].to_numpy()
+        next_user_id = assign_new_ids(user_ids, user_lookup, next_user_id)
+        next_movie_id = assign_new_ids(movie_ids, movie_lookup, next_movie_id)
+
+        df_chunk = pd.DataFrame(
+            {
+                "user_id": user_lookup[user_ids],
+                "movie_id": movie_lookup[movie_ids],
+                "rating": chunk["rating"].to_numpy(),
+                "timestamp": chunk["timestamp"].to_numpy(),
+            }
+        )
+
+        # Append rows to the bucket of their user id range
+        for bucket, df_bucket in df_chunk.groupby(df_chunk["user_id"] // bucket_size):
+            df_bucket.to_csv(
+                bucket_dir / f"bucket_{bucket:08d}.csv",
+                mode="a",
+                header=False,
+                index=False,
+            )
+
+    return user_lookup, movie_lookup
+
+
+def combine_buckets(bucket_dir: Path, file_name: str) -> str:
+    """
+    Third pass: sort each bucket by user and movie id and
+    combine them into one file.
+    """
+    columns = ["user_id", "movie_id", "rating", "timestamp"]
+    pd.DataFrame(columns=columns).to_csv(file_name, index=False)
+
+    for bucket_file in sorted(bucket_dir.glob("bucket_*.csv")):
+        df_bucket = pd.read_csv(bucket_file, names=columns)
+        df_bucket.sort_values(["user_id", "movie_id"]).to_csv(
+            file_name, mode="a", header=False, index=False
+        )
+
+    return file_name
+
+
+def save_id_map(lookup: np.ndarray, raw_column: str, new_column: str) -> pd.DataFrame:
+    """
+    Function to convert a lookup array into a DataFrame of raw and new ids.
+    """
+    raw_ids = np.flatnonzero(lookup >= 0)
+    df_map = pd.DataFrame({raw_column: raw_ids, new_column: lookup[raw_ids]})
+
+    return df_map.sort_values(new_column).reset_index(drop=True)
+
+
+def prepare_movies(
+    file_name: str, movie_lookup: np.ndarray, counts: np.ndarray, sums: np.ndarray
+) -> pd.DataFrame:
+    """
+    Function to add sequential ids and average ratings to the movies table.
+    """
+    movies = pd.read_csv(file_name)
+    movies = movies[movies["movieId"] < len(movie_lookup)].copy()
+
+    raw_ids = movies["movieId"].to_numpy()
+    movies["movie_id"] = movie_lookup[raw_ids]
+    movies = movies[movies["movie_id"] >= 0].copy()
+
+    raw_ids = movies["movieId"].to_numpy()
+    movies["rating"] = sums[raw_ids] / counts[raw_ids]
+
+    return movies[["movie_id", "title", "genres", "rating"]].sort_values("movie_id")
+
+
+def prepare_data(
+    source_dir: str = "data/ml-latest-small",
+    target_dir: str = "data",
+    min_ratings: int = 20,
+    chunksize: int = 1_000_000,
+) -> list[str]:
+    """
+    Function to prepare ratings and movies of a MovieLens dump.
+    Keeps movies with more than min_ratings ratings and saves
+    the prepared data along with the maps from raw to new ids.
+    """
+    ratings_file = f"{source_dir}/ratings.csv"
+
+    counts, sums, max_user_id = count_ratings(ratings_file, chunksize)
+    popular = counts > min_ratings
+    print(f"{popular.sum()} of {(counts > 0).sum()} movies have enough ratings.")
+
+    bucket_dir = Path(tempfile.mkdtemp(prefix="buckets_", dir=target_dir))
+    try:
+        user_lookup, movie_lookup = remap_ratings(
+            ratings_file, popular, max_user_id, bucket_dir, chunksize=chunksize
+        )
+        ratings_prepared = combine_buckets(
+            bucket_dir, f"{target_dir}/ratings_prepared.csv"
+        )
+    finally:
+        shutil.rmtree(bucket_dir)
+
+    user_id_map = f"{target_dir}/user_id_map.csv"
+    save_id_map(user_lookup, "userId", "user_id").to_csv(user_id_map, index=False)
+
+    movie_id_map = f"{target_dir}/movie_id_map.csv"
+    save_id_map(movie_lookup, "movieId", "movie_id").to_csv(movie_id_map, index=False)
+
+    movies_prepared = f"{target_dir}/movies_prepared.csv"
+    prepare_movies(f"{source_dir}/movies.csv", movie_lookup, counts, sums).to_csv(
+        movies_prepared, index=False
+    )
+
+    return [ratings_prepared, movies_prepared, user_id_map, movie_id_map]
+
+
+def main(source_dir: str = "data/ml-latest-small", target_dir: str = "data") -> None:
+    """
+    Main function
+    """
+    for file_name in prepare_data(source_dir, target_dir):
+        print(f"Saved {file_name}.")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -2,29 +2,55 @@
 Class to recommend movies.
 """
 
+import asyncio
+import functools
 import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Executor, ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 from scipy.sparse import csr_matrix
 
+# Long-lived pool for recommend_async. The default executor of an event loop
+# is joined by asyncio.run(), which would wait for abandoned calls.
+EXECUTOR = ThreadPoolExecutor(thread_name_prefix="recommender")
+
 
 class Recommender:
     """
     Class to recommend movies based on user ratings input.
     """
 
+    # Answers served by the models, used as fallback when a deadline is missed.
+    # Shared by all sessions, so it is only accessed while holding the lock.
+    cache: OrderedDict = OrderedDict()
+    cache_lock = threading.Lock()
+    cache_size: int = 1024
+
     def __init__(
-        self, query: dict[int, float], method: str = "neighbors", k: int = 10
+        self,
+        query: dict[int, float],
+        method: str = "neighbors",
+        k: int = 10,
+        snapshot=None,
     ) -> None:
         self.query = query
         self.method = self.validate_method(method)
         self.k = k
+        # Model snapshot to use (see model_store.py), models are loaded
+        # from data/ if None
+        self.snapshot = snapshot
 
-    def recommend(self) -> tuple[list[int], list[str]]:
+    def recommend(
+        self, cancel: threading.Event | None = None
+    ) -> tuple[list[int], list[str]]:
         """
         Recommends the top k movies for any given input query.
         Returns a list of k movie ids and corresponding movie titles.
+        If the cancel event is set, the calculation stops at the next step
+        and raises a CancelledError.
         """
 
         # Create user vector
@@ -33,30 +59,102 @@ class Recommender:
 
         # Fill missing values
         df_query_filled = df_query.fillna(0)
+        self.check_cancelled(cancel)
 
         if self.method == "nmf":
             # Use Non-negative Matrix Factorization (NMF)
-            movie_ids = self.recommender_nmf(df_query_filled)
+            movie_ids = self.recommender_nmf(df_query_filled, cancel)
         else:
             # Use Nearest Neighbors
-            movie_ids = self.recommender_neighbors(df_query_filled)
+            movie_ids = self.recommender_neighbors(df_query_filled, cancel)
+        self.check_cancelled(cancel)
 
         # Get corresponding titles in the same order
         titles = self.get_movie_titles_by_ids(movie_ids)
 
         return movie_ids, titles
 
-    def recommender_nmf(self, df_query: pd.DataFrame) -> pd.Series:
+    async def recommend_async(
+        self, timeout: float = 2.0, executor: Executor | None = None
+    ) -> tuple[pd.Series, list[str], str]:
+        """
+        Recommends the top k movies like recommend(), but runs the models in
+        an executor and gives up after timeout seconds. If the deadline is
+        missed, falls back to a cached answer for the same query or else
+        to the best rated movies, and the calculation is cancelled at its
+        next step so it frees its worker.
+        The executor must outlive the event loop, by default EXECUTOR is used.
+        Returns movie ids, titles and the tier that served the response:
+        "model", "cache" or "popular".
+        """
+        loop = asyncio.get_running_loop()
+        key = self.get_cache_key()
+        cancel = threading.Event()
+
+        try:
+            # On timeout a pending call is cancelled by wait_for(). A call that
+            # has already started can't be interrupted, it checks the event
+            # between its steps instead.
+            movie_ids, titles = await asyncio.wait_for(
+                loop.run_in_executor(
+                    executor or EXECUTOR, functools.partial(self.recommend, cancel)
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            cancel.set()
+            with self.cache_lock:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.cache.move_to_end(key)
+
+            if cached is not None:
+                movie_ids, titles = cached
+                return movie_ids, titles, "cache"
+
+            movie_ids, titles = self.recommend_popular()
+            return movie_ids, titles, "popular"
+
+        with self.cache_lock:
+            self.cache[key] = (movie_ids, titles)
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return movie_ids, titles, "model"
+
+    def recommend_popular(self) -> tuple[pd.Series, list[str]]:
+        """
+        Recommends the k best rated movies the user didn't rate.
+        Cheap fallback if the models take too long.
+        """
+        movies, _ = self.load_prepared_data()
+        movies = movies[~movies["movie_id"].isin(self.query)]
+        movies = movies.sort_values("rating", ascending=False).iloc[: self.k]
+
+        return movies["movie_id"].reset_index(drop=True), movies["title"].tolist()
+
+    def get_cache_key(self) -> tuple:
+        """
+        Function to get a key identifying the model version, query, method and k.
+        """
+        version = None if self.snapshot is None else self.snapshot.version
+        return (version, self.method, self.k, tuple(sorted(self.query.items())))
+
+    def recommender_nmf(
+        self, df_query: pd.DataFrame, cancel: threading.Event | None = None
+    ) -> pd.Series:
         """
         Filters and recommends the top k movies for any given input query
         based on a trained NMF model.
         Returns a list of k movie ids.
         """
-        # Load the model from file
-        model = self.load_model("data/model_nmf.pkl")
+        # Get the model from the snapshot or load it from file
+        model = self.get_model("nmf")
 
         # Create user-feature matrix P for new user
         p_matrix = model.transform(df_query)
+        self.check_cancelled(cancel)
 
         # Reconstruct the user-movie(item) matrix/dataframe for the new user
         q_matrix = model.components_
@@ -73,19 +171,22 @@ class Recommender:
 
         return movie_ids
 
-    def recommender_neighbors(self, df_query: pd.DataFrame) -> list:
+    def recommender_neighbors(
+        self, df_query: pd.DataFrame, cancel: threading.Event | None = None
+    ) -> list:
         """
         Filters and recommends the top k movies for any given input query
         based on a trained nearest neighbors model.
         Returns a list of k movie ids.
         """
-        # Load the model from file
-        model = self.load_model("data/model_neighbors.pkl")
+        # Get the model from the snapshot or load it from file
+        model = self.get_model("neighbors")
 
         # Calculate the distances to other users
         similarity_scores, neighbor_ids = model.kneighbors(
             df_query, n_neighbors=5, return_distance=True
         )
+        self.check_cancelled(cancel)
 
         # Save ids and scores in a DataFrame and sort it
         df_neighbors = pd.DataFrame(
@@ -104,6 +205,7 @@ class Recommender:
             (ratings["rating"], (ratings["user_id"], ratings["movie_id"]))
         )
         df_r = pd.DataFrame(r_matrix.todense())
+        self.check_cancelled(cancel)
 
         # Filter to only show similar users and filter out movies rated by the user
         neighborhood_filtered = df_r.iloc[neighbor_ids[0]].drop(
@@ -128,6 +230,15 @@ class Recommender:
 
         return movie_ids
 
+    def get_model(self, method: str) -> object:
+        """
+        Function to get a model from the snapshot or else from its pickle file.
+        """
+        if self.snapshot is not None:
+            return self.snapshot.models[method]
+
+        return self.load_model(f"data/model_{method}.pkl")
+
     def load_model(self, file_name: str) -> object:
         """
         Function to load a model from a pickle file.
@@ -139,8 +250,11 @@ class Recommender:
 
     def load_prepared_data(self) -> tuple[pd.DataFrame, pd.DataFrame]:
         """
-        Function to load prepared data from CSV files.
+        Function to load prepared data from the snapshot, or else from CSV files.
         """
+        if self.snapshot is not None:
+            return self.snapshot.data["movies"], self.snapshot.data["ratings"]
+
         ratings = pd.read_csv("./data/ratings_prepared.csv")
         movies = pd.read_csv("./data/movies_prepared.csv")
         return movies, ratings
@@ -161,6 +275,13 @@ class Recommender:
 
         return titles
 
+    def check_cancelled(self, cancel: threading.Event | None) -> None:
+        """
+        Function to stop a calculation whose result is no longer needed.
+        """
+        if cancel is not None and cancel.is_set():
+            raise CancelledError("Recommendation cancelled after the deadline.")
+
     def validate_method(self, method: str) -> str:
         """
         Function to validate the method.
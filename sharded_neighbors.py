@@ -0,0 +1,187 @@
+"""
+Nearest Neighbors model that partitions users into shards.
+"""
+
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import NearestNeighbors
+
+# Shard held by a worker process, set once when the worker starts
+WORKER_SHARD = None
+
+
+def query_shard(
+    shard: NearestNeighbors, x_query, n_neighbors: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function to get the nearest neighbors within one shard.
+    """
+    return shard.kneighbors(x_query, n_neighbors=n_neighbors, return_distance=True)
+
+
+def init_worker(shard: NearestNeighbors) -> None:
+    """
+    Function to load a shard into a worker process once.
+    """
+    global WORKER_SHARD  # pylint: disable=global-statement
+    WORKER_SHARD = shard
+
+
+def query_worker_shard(x_query, n_neighbors: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function to get the nearest neighbors within the shard of a worker process.
+    Only the query is sent to the worker, not the shard.
+    """
+    return query_shard(WORKER_SHARD, x_query, n_neighbors)
+
+
+class ShardedNearestNeighbors:
+    """
+    Class that splits the rows of a user-item matrix into shards with their
+    own Nearest Neighbors index. Queries are sent to all shards in parallel
+    and the partial results are merged into the exact overall top k.
+    With the "process" backend every shard lives in its own worker process,
+    n_jobs only limits the threads of the "thread" backend.
+    """
+
+    def __init__(
+        self,
+        n_shards: int = 2,
+        metric: str = "cosine",
+        n_jobs: int = -1,
+        n_neighbors: int = 5,
+        backend: str = "thread",
+    ) -> None:
+        if n_shards < 1:
+            raise ValueError("Invalid number of shards. Please choose at least 1.")
+        if backend not in ["thread", "process"]:
+            raise ValueError("Invalid backend. Please choose 'thread' or 'process'.")
+
+        self.n_shards = n_shards
+        self.metric = metric
+        self.n_jobs = n_jobs
+        self.n_neighbors = n_neighbors
+        self.backend = backend
+        self.shards_ = []
+        self.offsets_ = np.array([], dtype=int)
+        self.n_samples_fit_ = 0
+        self._executors = []
+
+    def fit(self, x_matrix) -> "ShardedNearestNeighbors":
+        """
+        Splits the rows into contiguous shards and fits one index per shard.
+        """
+        # Workers of the "process" backend still hold the old shards
+        self.close()
+
+        x_matrix = csr_matrix(x_matrix)
+        self.n_samples_fit_ = x_matrix.shape[0]
+
+        bounds = np.array_split(np.arange(self.n_samples_fit_), self.n_shards)
+        bounds = [rows for rows in bounds if len(rows) > 0]
+
+        self.offsets_ = np.array([rows[0] for rows in bounds], dtype=int)
+        self.shards_ = [
+            NearestNeighbors(metric=self.metric, n_jobs=1).fit(
+                x_matrix[rows[0] : rows[-1] + 1]
+            )
+            for rows in bounds
+        ]
+
+        return self
+
+    def kneighbors(
+        self, x_query, n_neighbors: int | None = None, return_distance: bool = True
+    ):
+        """
+        Finds the k nearest neighbors of each query row across all shards.
+        Returns distances and global row indices like NearestNeighbors.
+        Neighbors with equal distances may come in any order.
+        """
+        if n_neighbors is None:
+            n_neighbors = self.n_neighbors
+        if n_neighbors > self.n_samples_fit_:
+            raise ValueError(
+                f"Expected n_neighbors <= n_samples_fit, but n_neighbors = "
+                f"{n_neighbors}, n_samples_fit = {self.n_samples_fit_}"
+            )
+
+        # Each shard returns at most its own size, the merge keeps the best k
+        executors = self.get_executors()
+        if self.backend == "process":
+            futures = [
+                executor.submit(
+                    query_worker_shard, x_query, min(n_neighbors, shard.n_samples_fit_)
+                )
+                for executor, shard in zip(executors, self.shards_)
+            ]
+        else:
+            futures = [
+                executors[0].submit(
+                    query_shard, shard, x_query, min(n_neighbors, shard.n_samples_fit_)
+                )
+                for shard in self.shards_
+            ]
+        results = [future.result() for future in futures]
+
+        distances = np.hstack([dist for dist, _ in results])
+        indices = np.hstack(
+            [ind + offset for (_, ind), offset in zip(results, self.offsets_)]
+        )
+
+        # Sort by distance and keep the k best per row. Which of several tied
+        # neighbors each shard returns is up to NearestNeighbors, so ties can
+        # differ from an unsharded index
+        order = np.lexsort((indices, distances), axis=-1)[:, :n_neighbors]
+        distances = np.take_along_axis(distances, order, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+    def get_executors(self) -> list[Executor]:
+        """
+        Function to lazily create the pools that query the shards:
+        one shared thread pool, or one single worker process per shard
+        that loads its shard once.
+        """
+        if not self._executors:
+            if self.backend == "process":
+                self._executors = [
+                    ProcessPoolExecutor(
+                        max_workers=1, initializer=init_worker, initargs=(shard,)
+                    )
+                    for shard in self.shards_
+                ]
+            else:
+                max_workers = len(self.shards_)
+                if self.n_jobs > 0:
+                    max_workers = min(self.n_jobs, max_workers)
+                max_workers = max(1, min(max_workers, os.cpu_count() or 1))
+                self._executors = [ThreadPoolExecutor(max_workers=max_workers)]
+
+        return self._executors
+
+    def close(self) -> None:
+        """
+        Shuts down the pools. They are created again on the next query.
+        """
+        for executor in self._executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors = []
+
+    def __del__(self) -> None:
+        # Objects that failed in __init__ have no pools
+        if getattr(self, "_executors", None):
+            for executor in self._executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def __getstate__(self) -> dict:
+        # Pools can't be pickled, new ones are created after loading
+        state = self.__dict__.copy()
+        state["_executors"] = []
+        return state
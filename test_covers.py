@@ -0,0 +1,145 @@
+"""
+Unit tests (pytest) for the local cover thumbnail store.
+"""
+
+import functools
+import io
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from get_covers import (
+    THUMBNAIL_SIZE,
+    cover_index_mtime,
+    cover_path,
+    download_covers,
+    load_cover_index,
+    read_covers,
+)
+
+
+class CoverHandler(SimpleHTTPRequestHandler):
+    """
+    Request handler that also serves a response cut off before its end.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path == "/truncated.png":
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            self.wfile.write(b"\x89PNG")
+            return
+        super().do_GET()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="cover_server")
+def fixture_cover_server(tmp_path):
+    """
+    Fixture to serve stub cover images from a local HTTP server.
+    """
+    serve_dir = tmp_path / "serve"
+    serve_dir.mkdir()
+    for name, color in [("red.png", "red"), ("blue.png", "blue")]:
+        Image.new("RGB", (300, 450), color).save(serve_dir / name)
+    (serve_dir / "broken.jpg").write_bytes(b"not an image")
+
+    handler = functools.partial(CoverHandler, directory=str(serve_dir))
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_covers(cover_server, tmp_path):
+    """
+    Test that covers are downloaded, resized to a fixed size and deduplicated,
+    and that missing, broken or cut off images are skipped.
+    """
+    cover_dir = tmp_path / "covers"
+    assert cover_index_mtime(cover_dir) == 0.0
+    movies = pd.DataFrame(
+        {
+            "movie_id": [0, 1, 2, 3, 4, 5, 6],
+            "cover_url": [
+                f"{cover_server}/red.png",
+                f"{cover_server}/blue.png",
+                f"{cover_server}/red.png",
+                f"{cover_server}/missing.png",
+                f"{cover_server}/broken.jpg",
+                None,
+                f"{cover_server}/truncated.png",
+            ],
+        }
+    )
+
+    index = download_covers(movies, cover_dir, max_workers=4)
+
+    assert sorted(index["movie_id"]) == [0, 1, 2]
+    assert index["digest"].nunique() == 2, "Identical covers should be stored once."
+
+    for digest in index["digest"]:
+        with Image.open(cover_path(digest, cover_dir)) as image:
+            assert image.size == THUMBNAIL_SIZE
+
+    # The index is persisted and stored covers are not downloaded again
+    assert len(load_cover_index(cover_dir)) == 3
+    assert cover_index_mtime(cover_dir) > 0
+    index = download_covers(movies.iloc[:3], cover_dir, fetch=pytest.fail)
+    assert len(index) == 3
+
+
+def test_download_covers_errors(tmp_path):
+    """
+    Test that an unexpected error skips only its own cover and
+    the other covers are still saved to the index.
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 450), "green").save(buffer, format="PNG")
+
+    def fetch(url):
+        if url.endswith("bomb.png"):
+            raise Image.DecompressionBombError("too large")
+        return buffer.getvalue()
+
+    cover_dir = tmp_path / "covers"
+    movies = pd.DataFrame(
+        {
+            "movie_id": [0, 1],
+            "cover_url": ["http://covers.test/bomb.png", "http://covers.test/ok.png"],
+        }
+    )
+
+    index = download_covers(movies, cover_dir, fetch=fetch)
+
+    assert list(index["movie_id"]) == [1]
+    assert list(load_cover_index(cover_dir)["movie_id"]) == [1]
+
+
+def test_read_covers(cover_server, tmp_path):
+    """
+    Test that stored covers are returned as bytes and missing ones as None.
+    """
+    cover_dir = tmp_path / "covers"
+    movies = pd.DataFrame({"movie_id": [7], "cover_url": [f"{cover_server}/red.png"]})
+    index = download_covers(movies, cover_dir)
+
+    covers = read_covers([7, 8], index, cover_dir)
+
+    assert isinstance(covers[7], bytes)
+    assert Image.open(io.BytesIO(covers[7])).size == THUMBNAIL_SIZE
+    assert covers[8] is None
+
+
+if __name__ == "__main__":
+    pytest.main()
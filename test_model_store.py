@@ -0,0 +1,183 @@
+"""
+Unit tests (pytest) for versioned model snapshots and the ModelStore class.
+"""
+
+import gc
+import threading
+import weakref
+
+import pandas as pd
+import pytest
+
+import build_models
+import recommender
+from build_models import (
+    build_model_neighbors,
+    build_model_nmf,
+    copy_prepared_data,
+    prune_snapshots,
+    write_snapshot,
+)
+from model_store import ModelSnapshot, ModelStore, publish_snapshot
+from recommender import Recommender
+
+
+def build_snapshot(model_dir, version):
+    """
+    Helper to build a small snapshot with both models and publish it.
+    """
+    staging_dir = model_dir / f".{version}.tmp"
+    staging_dir.mkdir(parents=True)
+    data_files = copy_prepared_data(staging_dir)
+    build_model_nmf(
+        n_components=2,
+        max_iter=20,
+        file_name=str(staging_dir / "model_nmf.pkl"),
+        ratings_file=data_files["ratings"],
+    )
+    build_model_neighbors(
+        file_name=str(staging_dir / "model_neighbors.pkl"),
+        ratings_file=data_files["ratings"],
+    )
+    write_snapshot(staging_dir, version, model_dir)
+    publish_snapshot(version, model_dir)
+
+
+def test_snapshot_manifest(tmp_path):
+    """
+    Test that a snapshot is written with a manifest and loads both models.
+    """
+    build_snapshot(tmp_path, "v1")
+
+    assert not list(tmp_path.glob(".*.tmp")), "Staging directory should be moved."
+    assert (tmp_path / "current").read_text(encoding="utf-8") == "v1"
+
+    snapshot = ModelSnapshot.load("v1", tmp_path)
+    assert snapshot.version == "v1"
+    assert sorted(snapshot.models) == ["neighbors", "nmf"]
+
+    assert sorted(snapshot.data) == ["movies", "ratings"]
+    pd.testing.assert_frame_equal(
+        snapshot.data["movies"], pd.read_csv("data/movies_prepared.csv")
+    )
+
+    # Corrupt model files are refused
+    with open(tmp_path / "v1" / "model_nmf.pkl", "ab") as file:
+        file.write(b"corrupt")
+    with pytest.raises(ValueError):
+        ModelSnapshot.load("v1", tmp_path)
+
+
+def test_model_store_swap(tmp_path):
+    """
+    Test that the store swaps in a new snapshot while requests holding
+    the old one still work, and that the old snapshot is freed afterwards.
+    """
+    build_snapshot(tmp_path, "v1")
+    store = ModelStore(tmp_path)
+    old_snapshot = store.current
+    assert old_snapshot.version == "v1"
+    assert not store.refresh(), "Nothing should change without a new snapshot."
+
+    # A request that started on the old snapshot
+    in_flight = Recommender(
+        {10: 4, 100: 3}, method="neighbors", k=5, snapshot=old_snapshot
+    )
+
+    build_snapshot(tmp_path, "v2")
+    assert store.refresh()
+    assert store.current.version == "v2"
+
+    movie_ids, _ = in_flight.recommend()
+    assert len(movie_ids) == 5
+
+    old_ref = weakref.ref(old_snapshot)
+    del in_flight, old_snapshot
+    gc.collect()
+    assert old_ref() is None, "Old snapshot should be released."
+
+
+def test_snapshot_data(tmp_path, monkeypatch):
+    """
+    Test that recommendations with a snapshot only use the snapshot's data,
+    and that warm-up queries are made of movies in that data.
+    """
+    build_snapshot(tmp_path, "v1")
+    snapshot = ModelSnapshot.load("v1", tmp_path)
+
+    [query] = snapshot.get_warm_queries()
+    assert set(query) <= set(snapshot.data["movies"]["movie_id"])
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError("Prepared data should come from the snapshot.")
+
+    monkeypatch.setattr(recommender.pd, "read_csv", read_csv)
+    for method in ["neighbors", "nmf"]:
+        movie_ids, _ = Recommender(query, method=method, snapshot=snapshot).recommend()
+        assert len(movie_ids) == 10
+
+
+def test_model_store_watch_errors(tmp_path, monkeypatch):
+    """
+    Test that the background thread keeps running after any error.
+    """
+    store = ModelStore(tmp_path)
+    calls = []
+    retried = threading.Event()
+
+    def refresh():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("unexpected")
+        retried.set()
+        return False
+
+    monkeypatch.setattr(store, "refresh", refresh)
+    store.start(interval=0.01)
+    try:
+        assert retried.wait(5), "refresh() should be called again after an error."
+    finally:
+        store.stop()
+
+
+def test_prune_snapshots(tmp_path):
+    """
+    Test that old snapshots are removed but the current one is kept.
+    """
+    # The staging directory of a running build already has its manifest
+    for version in ["v1", "v2", "v3", ".v4.tmp"]:
+        (tmp_path / version).mkdir()
+        (tmp_path / version / "manifest.json").write_text("{}", encoding="utf-8")
+    publish_snapshot("v1", tmp_path)
+
+    removed = prune_snapshots(keep=1, model_dir=tmp_path)
+
+    assert removed == ["v2"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        ".v4.tmp",
+        "current",
+        "v1",
+        "v3",
+    ]
+
+
+def test_build_failure_cleanup(tmp_path, monkeypatch):
+    """
+    Test that a failed build removes its staging directory
+    and publishes nothing.
+    """
+
+    def build_model_nmf(**kwargs):
+        raise MemoryError("too large")
+
+    monkeypatch.setattr(build_models, "MODEL_DIR", tmp_path)
+    monkeypatch.setattr(build_models, "build_model_nmf", build_model_nmf)
+
+    with pytest.raises(MemoryError):
+        build_models.main()
+
+    assert not list(tmp_path.iterdir())
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,37 @@
+"""
+Unit tests (pytest) for the chunked data preparation.
+"""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from prepare_data import prepare_data
+
+
+def test_prepare_data(tmp_path):
+    """
+    Test that preparing the data in small chunks gives the same result
+    as the prepared data shipped with the app.
+    """
+    prepare_data(target_dir=str(tmp_path), chunksize=5000)
+
+    for name in ["ratings_prepared.csv", "movies_prepared.csv"]:
+        assert (tmp_path / name).read_bytes() == Path(
+            f"data/{name}"
+        ).read_bytes(), f"{name} differs from the shipped data."
+
+    # Id maps link every new id to exactly one raw id
+    user_id_map = pd.read_csv(tmp_path / "user_id_map.csv")
+    movie_id_map = pd.read_csv(tmp_path / "movie_id_map.csv")
+    ratings = pd.read_csv(tmp_path / "ratings_prepared.csv")
+
+    assert user_id_map["user_id"].tolist() == list(range(ratings["user_id"].nunique()))
+    assert movie_id_map["movie_id"].tolist() == list(
+        range(ratings["movie_id"].nunique())
+    )
+    assert user_id_map["userId"].is_unique and movie_id_map["movieId"].is_unique
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -2,6 +2,12 @@
 
 Unit tests (pytest) for the Recommender class.
 """
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
 import pandas as pd
 import pytest
 
@@ -131,5 +137,109 @@ def test_load_prepared_data():
     ), f"ratings should be a Pandas Dataframe, {type(ratings)} found."
 
 
+def test_recommend_async(recommender_neighbors_instance):
+    """
+    Test the "recommend_async" method to ensure it serves results from
+    the model, falls back to the best rated movies when the deadline is
+    missed and to the cached answer once the query has been served.
+    """
+    Recommender.cache.clear()
+
+    movie_ids, titles, tier = asyncio.run(
+        recommender_neighbors_instance.recommend_async(timeout=0)
+    )
+    assert tier == "popular", f"tier should be 'popular', {tier} found."
+    assert len(movie_ids) == 5 and len(titles) == 5
+    assert not movie_ids.isin(recommender_neighbors_instance.query).any()
+
+    model_ids, _, tier = asyncio.run(
+        recommender_neighbors_instance.recommend_async(timeout=60)
+    )
+    assert tier == "model", f"tier should be 'model', {tier} found."
+
+    movie_ids, _, tier = asyncio.run(
+        recommender_neighbors_instance.recommend_async(timeout=0)
+    )
+    assert tier == "cache", f"tier should be 'cache', {tier} found."
+    assert movie_ids.tolist() == model_ids.tolist()
+
+
+@pytest.mark.parametrize("own_executor", [False, True])
+def test_recommend_async_deadline(monkeypatch, own_executor):
+    """
+    Test that "recommend_async" returns close to the deadline
+    even if the abandoned calculation takes much longer.
+    """
+
+    def slow_recommend(_, cancel=None):
+        time.sleep(2)
+        return pd.Series([1]), ["Slow"]
+
+    monkeypatch.setattr(Recommender, "recommend", slow_recommend)
+    recommender = Recommender({10: 4}, method="neighbors", k=5)
+    executor = ThreadPoolExecutor(max_workers=1) if own_executor else None
+
+    try:
+        start = time.perf_counter()
+        _, _, tier = asyncio.run(recommender.recommend_async(0.2, executor))
+        elapsed = time.perf_counter() - start
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    assert tier in ["cache", "popular"], f"Fallback expected, {tier} found."
+    assert elapsed < 1, f"Call should return at the deadline, took {elapsed:.2f}s."
+
+
+def test_recommend_async_cancel(monkeypatch):
+    """
+    Test that calculations are cancelled after a missed deadline,
+    so they don't keep the workers busy for later requests.
+    """
+    slow_query = {10: 4}
+    cancelled = []
+
+    def recommender_neighbors(self, df_query, cancel=None):
+        if self.query == slow_query:
+            # A slow model step that only stops early when it is cancelled
+            if cancel is not None and cancel.wait(3):
+                cancelled.append(1)
+            else:
+                time.sleep(3)
+        return pd.Series([1, 2, 3])
+
+    monkeypatch.setattr(Recommender, "recommender_neighbors", recommender_neighbors)
+    executor = ThreadPoolExecutor(max_workers=3)
+
+    try:
+        # Time out as many calculations as there are workers
+        for _ in range(3):
+            _, _, tier = asyncio.run(
+                Recommender(slow_query, k=3).recommend_async(0.1, executor)
+            )
+            assert tier != "model", f"Fallback expected, {tier} found."
+
+        _, _, tier = asyncio.run(
+            Recommender({100: 3}, k=3).recommend_async(1, executor)
+        )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    assert tier == "model", f"Workers should be free again, {tier} found."
+    assert len(cancelled) == 3
+
+
+def test_recommend_async_cache_key():
+    """
+    Test that cached answers are kept apart per model snapshot version.
+    """
+    query = {10: 4, 100: 3}
+    old = Recommender(query, snapshot=SimpleNamespace(version="v1"))
+    new = Recommender(query, snapshot=SimpleNamespace(version="v2"))
+
+    assert old.get_cache_key() != new.get_cache_key()
+    assert Recommender(query).get_cache_key() == Recommender(query).get_cache_key()
+
+
 if __name__ == "__main__":
     pytest.main()
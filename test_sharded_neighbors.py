@@ -0,0 +1,111 @@
+"""
+Unit tests (pytest) for the ShardedNearestNeighbors class.
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import NearestNeighbors
+
+from build_models import build_model_neighbors
+from sharded_neighbors import ShardedNearestNeighbors
+
+
+@pytest.fixture(name="ratings_matrix", scope="module")
+def fixture_ratings_matrix():
+    """
+    Fixture to create the user-item rating matrix from the prepared data.
+    """
+    ratings = pd.read_csv("data/ratings_prepared.csv")
+    return csr_matrix((ratings["rating"], (ratings["user_id"], ratings["movie_id"])))
+
+
+@pytest.mark.parametrize(
+    "n_shards,backend", [(1, "thread"), (4, "thread"), (7, "process")]
+)
+def test_sharded_equals_unsharded(ratings_matrix, n_shards, backend):
+    """
+    Test that sharded queries return the same neighbors as a single index.
+    """
+    model = NearestNeighbors(metric="cosine").fit(ratings_matrix)
+    sharded = ShardedNearestNeighbors(
+        n_shards=n_shards, metric="cosine", backend=backend
+    ).fit(ratings_matrix)
+
+    queries = ratings_matrix[[0, 17, 250, 600]]
+    distances, indices = model.kneighbors(queries, n_neighbors=10)
+    sharded_distances, sharded_indices = sharded.kneighbors(queries, n_neighbors=10)
+
+    np.testing.assert_allclose(sharded_distances, distances, atol=1e-12)
+    for row, sharded_row, dist_row in zip(indices, sharded_indices, distances):
+        # Neighbors with equal distances may come in a different order
+        for dist in np.unique(dist_row):
+            assert set(row[dist_row == dist]) == set(sharded_row[dist_row == dist])
+
+
+def test_sharded_pickle(ratings_matrix):
+    """
+    Test that a sharded model can be pickled after it has been queried.
+    """
+    sharded = ShardedNearestNeighbors(n_shards=3).fit(ratings_matrix)
+    expected = sharded.kneighbors(ratings_matrix[[5]], return_distance=False)
+
+    loaded = pickle.loads(pickle.dumps(sharded))
+
+    np.testing.assert_array_equal(
+        loaded.kneighbors(ratings_matrix[[5]], return_distance=False), expected
+    )
+
+
+def test_sharded_process_workers(ratings_matrix):
+    """
+    Test that the process backend keeps one worker per shard, which holds
+    its shard, and that close() shuts the workers down.
+    """
+    sharded = ShardedNearestNeighbors(n_shards=3, backend="process").fit(ratings_matrix)
+    expected = sharded.kneighbors(ratings_matrix[[5]], return_distance=False)
+    executors = list(sharded._executors)  # pylint: disable=protected-access
+    assert len(executors) == 3
+
+    # Workers are reused for further queries
+    np.testing.assert_array_equal(
+        sharded.kneighbors(ratings_matrix[[5]], return_distance=False), expected
+    )
+    assert sharded._executors == executors  # pylint: disable=protected-access
+
+    sharded.close()
+    assert not sharded._executors  # pylint: disable=protected-access
+    with pytest.raises(RuntimeError):
+        executors[0].submit(print)
+
+
+def test_build_sharded_model(tmp_path):
+    """
+    Test that the build step saves a sharded model with the chosen backend.
+    """
+    file_name = build_model_neighbors(
+        n_shards=3, backend="process", file_name=str(tmp_path / "model.pkl")
+    )
+    with open(file_name, "rb") as file:
+        model = pickle.load(file)
+
+    assert isinstance(model, ShardedNearestNeighbors)
+    assert (model.n_shards, model.backend) == (3, "process")
+    assert len(model.shards_) == 3
+    model.close()
+
+
+def test_sharded_invalid_n_neighbors(ratings_matrix):
+    """
+    Test that asking for more neighbors than users raises a ValueError.
+    """
+    sharded = ShardedNearestNeighbors(n_shards=2).fit(ratings_matrix[:3])
+    with pytest.raises(ValueError):
+        sharded.kneighbors(ratings_matrix[[0]], n_neighbors=4)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,139 @@
+"""
+Unit tests (pytest) for the TitleIndex class.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from title_search import (
+    SOURCE_FILES,
+    TitleIndex,
+    add_favourites,
+    build_title_index,
+    load_title_index,
+    title_variants,
+)
+
+
+@pytest.fixture(name="title_index", scope="module")
+def fixture_title_index():
+    """
+    Fixture to build a title index from the prepared data.
+    """
+    return build_title_index(
+        pd.read_csv("data/movies_imdb.csv"),
+        pd.read_csv("data/movies_prepared.csv"),
+        pd.read_csv("data/ratings_prepared.csv"),
+    )
+
+
+def test_title_variants():
+    """
+    Test that alternate titles, trailing articles and years are recognized.
+    """
+    assert title_variants("Seven (a.k.a. Se7en) (1995)") == (["Seven", "Se7en"], "1995")
+
+    variants, year = title_variants("Postman, The (Postino, Il) (1994)")
+    assert "The Postman" in variants and "Il Postino" in variants
+    assert year == "1994"
+
+
+@pytest.mark.parametrize(
+    "query,title",
+    [
+        ("seven", "Se7en (1995)"),
+        ("se7en", "Se7en (1995)"),
+        ("the matr", "The Matrix (1999)"),
+        ("matrix 1999", "The Matrix (1999)"),
+        ("AMELIE", "Amélie (2001)"),
+        ("lola rennt", "Run Lola Run (1998)"),
+        ("shawshenk", "The Shawshank Redemption (1994)"),
+        ("godfater", "The Godfather (1972)"),
+        ("pulp fictoin", "Pulp Fiction (1994)"),
+    ],
+)
+def test_search(title_index, query, title):
+    """
+    Test that the expected movie is the best match for a query.
+    """
+    results = title_index.search(query, limit=5)
+
+    assert results, f"No results for {query}."
+    movie_id, best_title = results[0]
+    assert best_title == title
+    assert title_index.get_title(movie_id) == title
+
+
+def test_search_limit(title_index):
+    """
+    Test that searches return at most limit unique movies.
+    """
+    for query in ["", "t", "the", "star wars"]:
+        movie_ids = [movie_id for movie_id, _ in title_index.search(query, limit=7)]
+        assert 0 < len(movie_ids) <= 7
+        assert len(set(movie_ids)) == len(movie_ids)
+
+    # Neither unknown nor repetitive misspellings match anything
+    for query in ["xyzzy", "aaaaaaaaaaaaaaaaaaaa", "abababababab"]:
+        assert not title_index.search(query), f"No results expected for {query}."
+
+
+def test_favourites_flow(title_index):
+    """
+    Test that movies picked from several searches add up to one query,
+    as in the picker of the app.
+    """
+    favourites = []
+
+    candidates = title_index.get_candidates("matrix", exclude=favourites)
+    favourites = add_favourites(favourites, candidates[:1])
+
+    candidates = title_index.get_candidates("star wars", exclude=favourites)
+    favourites = add_favourites(favourites, candidates[:2])
+
+    # Movies already picked are not offered or added again
+    candidates = title_index.get_candidates("matrix", exclude=favourites)
+    assert favourites[0] not in candidates
+    favourites = add_favourites(favourites, favourites[:1])
+
+    titles = [title_index.get_title(movie_id) for movie_id in favourites]
+    assert titles[0] == "The Matrix (1999)"
+    assert len(titles) == 3 and all("Star Wars" in title for title in titles[1:])
+
+
+def test_load_title_index(tmp_path):
+    """
+    Test that a saved index is reused, and rebuilt once a source file changes.
+    """
+    files = []
+    for source in SOURCE_FILES:
+        files.append(tmp_path / source.split("/")[-1])
+        files[-1].write_bytes(Path(source).read_bytes())
+    file_name = str(tmp_path / "title_index.pkl")
+
+    index = load_title_index(file_name, files)
+    assert load_title_index(file_name, files).sources == index.sources
+
+    # Rename a movie in the catalog
+    movies = pd.read_csv(files[0])
+    movies.loc[movies["title"] == "The Matrix", "title"] = "The Matrix Renamed"
+    movies.to_csv(files[0], index=False)
+
+    index = load_title_index(file_name, files)
+    assert index.search("the matrix", limit=1)[0][1] == "The Matrix Renamed (1999)"
+
+
+def test_save_load(title_index, tmp_path):
+    """
+    Test that a saved index returns the same results after loading.
+    """
+    file_name = title_index.save(str(tmp_path / "title_index.pkl"))
+    loaded = TitleIndex.load(file_name)
+
+    assert loaded.search("star") == title_index.search("star")
+
+
+if __name__ == "__main__":
+    pytest.main()
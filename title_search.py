@@ -0,0 +1,329 @@
+"""
+Search index to find movies by title
+"""
+
+import os
+import pickle
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "data/title_index.pkl"
+
+# Files the index is built from, in the order build_title_index() takes them
+SOURCE_FILES = [
+    "data/movies_imdb.csv",
+    "data/movies_prepared.csv",
+    "data/ratings_prepared.csv",
+]
+
+# Length of title prefixes stored for "starts with" matches
+MAX_PREFIX = 12
+
+ARTICLES = ["the", "a", "an", "la", "le", "les", "l'", "il", "el", "der", "die", "das"]
+
+
+def normalize(text: str) -> str:
+    """
+    Function to lowercase a text and remove accents and punctuation.
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower().replace("'", ""))
+
+    return text.strip()
+
+
+def move_article(title: str) -> str:
+    """
+    Function to move a trailing article to the front,
+    e.g. "Matrix, The" becomes "The Matrix".
+    """
+    match = re.match(r"^(.*), (\S+)$", title.strip())
+    if match and match.group(2).lower() in ARTICLES:
+        separator = "" if match.group(2).endswith("'") else " "
+        return f"{match.group(2)}{separator}{match.group(1)}"
+
+    return title
+
+
+def title_variants(title: str) -> tuple[list[str], str | None]:
+    """
+    Function to split a MovieLens title into its variants and the year.
+    "Seven (a.k.a. Se7en) (1995)" gives ["Seven", "Se7en"] and "1995".
+    """
+    year = None
+    match = re.search(r"\s*\((\d{4})(?:[-–]\d{0,4})?\)\s*$", title)
+    if match:
+        year = match.group(1)
+        title = title[: match.start()]
+
+    # Alternate titles are given in parentheses
+    alternates = re.findall(r"\(([^()]*)\)", title)
+    main_title = re.sub(r"\s*\([^()]*\)", "", title)
+
+    variants = [main_title]
+    for alternate in alternates:
+        variants.append(re.sub(r"^a\.k\.a\.\s*", "", alternate.strip()))
+
+    # Index titles with a trailing article both ways
+    variants += [move_article(variant) for variant in variants]
+
+    return [variant for variant in dict.fromkeys(variants) if variant], year
+
+
+def source_stamps(files: list[str] = SOURCE_FILES) -> tuple:
+    """
+    Function to get size and modification time of the source files,
+    to tell whether a saved index is outdated.
+    """
+    stamps = []
+    for file_name in files:
+        stat = Path(file_name).stat()
+        stamps.append((str(file_name), stat.st_size, stat.st_mtime_ns))
+
+    return tuple(stamps)
+
+
+def add_favourites(favourites: list[int], movie_ids: list[int]) -> list[int]:
+    """
+    Function to add movie ids to a list of favourites, keeping its order
+    and leaving out movies that are already in it.
+    """
+    return list(dict.fromkeys([*favourites, *(int(mid) for mid in movie_ids)]))
+
+
+class TitleIndex:
+    """
+    Class to search movies by title using prefix postings for words and
+    titles, and trigram postings for misspelled queries.
+    Movies are numbered by popularity, so postings are sorted by rank.
+    """
+
+    def __init__(
+        self, movie_ids: list[int], titles: list[str], variants: list[list[str]]
+    ) -> None:
+        self.movie_ids = np.asarray(movie_ids)
+        self.titles = list(titles)
+        self.positions = {int(mid): doc for doc, mid in enumerate(self.movie_ids)}
+        # Stamps of the files the index was built from, see source_stamps()
+        self.sources = None
+
+        prefixes, title_prefixes, trigrams = {}, {}, {}
+        self.variants = []
+
+        for doc, doc_variants in enumerate(variants):
+            normalized = list(dict.fromkeys(normalize(v) for v in doc_variants))
+            self.variants.append([text for text in normalized if text])
+
+            for text in self.variants[doc]:
+                for length in range(1, min(len(text), MAX_PREFIX) + 1):
+                    title_prefixes.setdefault(text[:length], set()).add(doc)
+
+                for token in text.split():
+                    for length in range(1, len(token) + 1):
+                        prefixes.setdefault(token[:length], set()).add(doc)
+
+                    padded = f"  {token} "
+                    for start in range(len(padded) - 2):
+                        trigrams.setdefault(padded[start : start + 3], set()).add(doc)
+
+        def to_arrays(postings: dict) -> dict[str, np.ndarray]:
+            return {
+                key: np.array(sorted(docs), dtype=np.int32)
+                for key, docs in postings.items()
+            }
+
+        self.prefixes = to_arrays(prefixes)
+        self.title_prefixes = to_arrays(title_prefixes)
+        self.trigrams = to_arrays(trigrams)
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[int, str]]:
+        """
+        Finds movies matching a query. Returns up to limit movie ids and titles.
+        Titles starting with the query rank first, followed by titles
+        containing all words of the query, each ordered by popularity.
+        Falls back to trigram similarity if no title matches.
+        """
+        text = normalize(query)
+        if not text:
+            docs = np.arange(min(limit, len(self.titles)))
+            return self.get_results(docs)
+
+        starts = self.title_prefixes.get(text[:MAX_PREFIX], np.array([], dtype=int))
+        if len(text) > MAX_PREFIX:
+            starts = np.array(
+                [
+                    doc
+                    for doc in starts
+                    if any(v.startswith(text) for v in self.variants[doc])
+                ],
+                dtype=int,
+            )
+
+        # Intersect the postings of all words, shortest first
+        postings = sorted(
+            (
+                self.prefixes.get(token, np.array([], dtype=int))
+                for token in text.split()
+            ),
+            key=len,
+        )
+        words = postings[0]
+        for posting in postings[1:]:
+            if len(words) == 0:
+                break
+            words = np.intersect1d(words, posting, assume_unique=True)
+
+        docs = np.concatenate(
+            [starts[:limit], np.setdiff1d(words[: 2 * limit], starts[:limit])]
+        )
+        if len(docs) == 0:
+            docs = self.search_trigrams(text, limit)
+
+        return self.get_results(docs[:limit])
+
+    def get_candidates(
+        self, query: str, exclude: list[int], limit: int = 20
+    ) -> list[int]:
+        """
+        Finds up to limit movie ids matching a query, leaving out
+        the movies in exclude, e.g. the ones already selected.
+        """
+        results = self.search(query, limit=limit + len(exclude))
+        excluded = set(exclude)
+
+        return [mid for mid, _ in results if mid not in excluded][:limit]
+
+    def search_trigrams(self, text: str, limit: int) -> np.ndarray:
+        """
+        Finds movies sharing most trigrams with the query, for misspellings.
+        Only movies sharing at least half as many distinct trigrams as the
+        query has, repeats included, are returned. Repetitive queries like
+        "aaaaaaaa" have few distinct trigrams and don't match anything.
+        """
+        query_trigrams = []
+        for token in text.split():
+            padded = f"  {token} "
+            query_trigrams += [
+                padded[start : start + 3] for start in range(len(padded) - 2)
+            ]
+
+        postings = [
+            self.trigrams[tri] for tri in set(query_trigrams) if tri in self.trigrams
+        ]
+        if not postings:
+            return np.array([], dtype=int)
+
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.titles))
+        docs = np.flatnonzero(counts >= len(query_trigrams) / 2)
+
+        # Most shared trigrams first, more popular movies first on ties
+        order = np.lexsort((docs, -counts[docs]))
+
+        return docs[order][:limit]
+
+    def get_results(self, docs: np.ndarray) -> list[tuple[int, str]]:
+        """
+        Function to get movie ids and titles of documents.
+        """
+        return [(int(self.movie_ids[doc]), self.titles[doc]) for doc in docs]
+
+    def get_title(self, movie_id: int) -> str:
+        """
+        Function to get the display title of a movie id.
+        """
+        return self.titles[self.positions[int(movie_id)]]
+
+    def save(self, file_name: str = INDEX_FILE) -> str:
+        """
+        Function to save the index to a pickle file.
+        """
+        temp_file = f"{file_name}.tmp"
+        with open(temp_file, "wb") as file:
+            pickle.dump(self, file)
+        os.replace(temp_file, file_name)
+
+        return file_name
+
+    @staticmethod
+    def load(file_name: str = INDEX_FILE) -> "TitleIndex":
+        """
+        Function to load an index from a pickle file.
+        """
+        with open(file_name, "rb") as file:
+            index = pickle.load(file)
+
+        return index
+
+
+def build_title_index(
+    movies: pd.DataFrame, movies_prepared: pd.DataFrame, ratings: pd.DataFrame
+) -> TitleIndex:
+    """
+    Function to build a title index for the movies with IMDB information.
+    Both IMDB and MovieLens titles are searchable, movies with more
+    ratings rank higher.
+    """
+    movies = movies[["movie_id", "title", "year"]].merge(
+        movies_prepared[["movie_id", "title"]].rename(columns={"title": "ml_title"}),
+        how="left",
+        on="movie_id",
+    )
+    movies["num_ratings"] = (
+        movies["movie_id"].map(ratings["movie_id"].value_counts()).fillna(0)
+    )
+    movies = movies.sort_values(
+        ["num_ratings", "movie_id"], ascending=[False, True]
+    ).reset_index(drop=True)
+
+    titles, variants = [], []
+    for title, year, ml_title in zip(
+        movies["title"], movies["year"], movies["ml_title"]
+    ):
+        doc_variants, ml_year = (
+            title_variants(ml_title) if isinstance(ml_title, str) else ([], None)
+        )
+        year = ml_year if pd.isnull(year) else str(int(year))
+
+        titles.append(f"{title} ({year})" if year else str(title))
+        variants.append([str(title), *doc_variants, *([year] if year else [])])
+
+    return TitleIndex(movies["movie_id"].tolist(), titles, variants)
+
+
+def load_title_index(
+    file_name: str = INDEX_FILE, files: list[str] = SOURCE_FILES
+) -> TitleIndex:
+    """
+    Function to load the saved index. It is built and saved again
+    if it doesn't exist or the source files have changed since.
+    """
+    stamps = source_stamps(files)
+
+    if Path(file_name).is_file():
+        index = TitleIndex.load(file_name)
+        if index.sources == stamps:
+            return index
+        print(f"Source files changed since {file_name} was built, rebuilding.")
+
+    index = build_title_index(*(pd.read_csv(source) for source in files))
+    index.sources = stamps
+    index.save(file_name)
+
+    return index
+
+
+def main() -> None:
+    """
+    Main function
+    """
+    index = load_title_index()
+    print(f"Title index with {len(index.titles)} movies is up to date in {INDEX_FILE}.")
+
+
+if __name__ == "__main__":
+    main()